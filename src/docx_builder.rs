@@ -1,9 +1,31 @@
 use crate::config::{Config, StructureItem};
+use crate::entities;
+use crate::punctuation::is_punctuation;
 use docx_rs::*;
+use std::collections::{HashMap, HashSet};
 use std::fs;
+use std::io::{BufWriter, Write};
 use std::path::Path;
-use regex::Regex;
-use pulldown_cmark::{Parser, Options, Event};
+use std::thread;
+
+const HALF_INCH: i32 = 720; // twips
+const SCENE_BREAK: &str = "#";
+const END_MARK: &str = "#  #  #";
+const MAX_WORKERS: usize = 8;
+
+// A markdown file already turned into body paragraphs, ready to append to the document.
+struct SourceFile {
+    paragraphs: Vec<Paragraph>,
+    // Kept for files appended more than once, so each earlier reference can build paragraphs of
+    // its own; every paragraph needs a unique paraId, which a clone would copy.
+    content: Option<String>,
+    words: usize,
+    // References left in the document body; the last one takes the parsed paragraphs.
+    uses: usize,
+}
+
+// The markdown files named in the structure, keyed by their path in the config.
+type Sources<'a> = HashMap<&'a str, SourceFile>;
 
 pub fn compile_manuscript(config_file: &str, output_dir: &str, blind: bool) -> Result<(), Box<dyn std::error::Error>> {
     println!("Starting manuscript compilation from '{}'...", config_file);
@@ -24,23 +46,21 @@ pub fn compile_manuscript(config_file: &str, output_dir: &str, blind: bool) -> R
         .default_size(24) // 12pt * 2 (half-points)
         .page_margin(PageMargin::new().top(1440).bottom(1440).left(1440).right(1440)); // 1 inch margins
 
-    let total_words = calculate_word_count(&config, config_dir).unwrap_or(0);
+    // Each file is read and parsed once; the word count and the document body share the result.
+    let mut sources = load_sources(&config, config_dir);
+    let total_words = calculate_word_count(&config, &sources);
 
     doc = setup_header(doc, &config, blind);
     doc = create_title_page(doc, &config, &story_type, total_words, blind);
 
-    let mut is_first_content_item = true;
+    for (idx, item) in config.structure.iter().enumerate() {
+        // Separate each top-level item from the previous one; the first follows the title page.
+        if idx > 0 {
+            doc = add_section_break(doc, &story_type);
+        }
 
-    for item in &config.structure {
         match item {
             StructureItem::Part { title, content } => {
-                if !is_first_content_item && story_type == "novel" {
-                    doc = doc.add_paragraph(Paragraph::new().add_run(Run::new().add_break(BreakType::Page)));
-                } else if !is_first_content_item && story_type == "short_story" {
-                    doc = doc.add_paragraph(Paragraph::new());
-                }
-                is_first_content_item = false;
-
                 doc = doc.add_paragraph(
                     Paragraph::new()
                         .align(AlignmentType::Center)
@@ -49,67 +69,41 @@ pub fn compile_manuscript(config_file: &str, output_dir: &str, blind: bool) -> R
                 doc = doc.add_paragraph(Paragraph::new());
 
                 for (i, chapter) in content.iter().enumerate() {
-                    if i > 0 && story_type == "novel" {
-                        doc = doc.add_paragraph(Paragraph::new().add_run(Run::new().add_break(BreakType::Page)));
-                    } else if i > 0 && story_type == "short_story" {
-                        doc = doc.add_paragraph(Paragraph::new());
+                    if i > 0 {
+                        doc = add_section_break(doc, &story_type);
                     }
-                    doc = process_chapter(chapter, doc, &story_type, config_dir)?;
+                    doc = process_chapter(chapter, doc, &story_type, &mut sources)?;
                 }
             }
             StructureItem::Chapter { .. } => {
-                if !is_first_content_item && story_type == "novel" {
-                    doc = doc.add_paragraph(Paragraph::new().add_run(Run::new().add_break(BreakType::Page)));
-                } else if !is_first_content_item && story_type == "short_story" {
-                    doc = doc.add_paragraph(Paragraph::new());
-                }
-                is_first_content_item = false;
-                doc = process_chapter(item, doc, &story_type, config_dir)?;
+                doc = process_chapter(item, doc, &story_type, &mut sources)?;
             }
             StructureItem::Text { .. } => {
-                if !is_first_content_item && story_type == "novel" {
-                    doc = doc.add_paragraph(Paragraph::new().add_run(Run::new().add_break(BreakType::Page)));
-                } else if !is_first_content_item && story_type == "short_story" {
-                    doc = doc.add_paragraph(Paragraph::new());
-                }
-                is_first_content_item = false;
-                doc = process_text_item(item, doc, config_dir)?;
+                doc = process_text_item(item, doc, &mut sources)?;
             }
         }
     }
 
-    doc = doc.add_paragraph(Paragraph::new().line_spacing(LineSpacing::new().line(480)));
-    doc = doc.add_paragraph(Paragraph::new().line_spacing(LineSpacing::new().line(480)));
+    doc = doc.add_paragraph(Paragraph::new().line_spacing(double_spaced()));
+    doc = doc.add_paragraph(Paragraph::new().line_spacing(double_spaced()));
     doc = doc.add_paragraph(
         Paragraph::new()
             .align(AlignmentType::Center)
-            .line_spacing(LineSpacing::new().line(480))
-            .add_run(Run::new().add_text("#  #  #"))
+            .line_spacing(double_spaced())
+            .add_run(Run::new().add_text(END_MARK))
     );
 
-    let file = std::fs::File::create(&output_path)?;
-    doc.build().pack(file)?;
+    // The zip writer emits many small writes; batch them into 64 KiB blocks.
+    let mut file = BufWriter::with_capacity(1 << 16, fs::File::create(&output_path)?);
+    doc.build().pack(&mut file)?;
+    file.flush()?;
 
     println!("\nCompilation complete! Manuscript saved to '{:?}'.", output_path);
     Ok(())
 }
 
-fn calculate_word_count(config: &Config, config_dir: &Path) -> Result<usize, Box<dyn std::error::Error>> {
-    let heading_re = Regex::new(r"^#{1,6}\s")?;
-    let mut total_words = 0;
-
-    let mut count_file = |file: &str| {
-        let actual_path = config_dir.join(file);
-        if let Ok(content) = fs::read_to_string(&actual_path) {
-            for line in content.lines() {
-                let trimmed = line.trim();
-                if trimmed.is_empty() || heading_re.is_match(trimmed) {
-                    continue;
-                }
-                total_words += trimmed.split_whitespace().count();
-            }
-        }
-    };
+fn structure_files(config: &Config) -> Vec<&str> {
+    let mut paths = Vec::new();
 
     for item in &config.structure {
         match item {
@@ -117,38 +111,136 @@ fn calculate_word_count(config: &Config, config_dir: &Path) -> Result<usize, Box
                 for chapter in content {
                     match chapter {
                         StructureItem::Chapter { file, files, .. } | StructureItem::Text { file, files, .. } => {
-                            if let Some(f) = file { count_file(f); }
-                            if let Some(fs) = files { for f in fs { count_file(f); } }
+                            push_item_files(&mut paths, file, files);
                         }
                         _ => {}
                     }
                 }
             }
             StructureItem::Chapter { file, files, .. } | StructureItem::Text { file, files, .. } => {
-                 if let Some(f) = file { count_file(f); }
-                 if let Some(fs) = files { for f in fs { count_file(f); } }
+                push_item_files(&mut paths, file, files);
             }
         }
     }
-    
-    let rounded = ((total_words as f64) / 100.0).round() as usize * 100;
-    Ok(rounded)
+    paths
+}
+
+fn push_item_files<'a>(paths: &mut Vec<&'a str>, file: &'a Option<String>, files: &'a Option<Vec<String>>) {
+    if let Some(f) = file { paths.push(f.as_str()); }
+    if let Some(fs) = files { paths.extend(fs.iter().map(String::as_str)); }
 }
 
-fn format_number(mut n: usize) -> String {
-    if n == 0 { return "0".to_string(); }
-    let mut s = String::new();
-    let mut count = 0;
-    while n > 0 {
-        if count == 3 {
+// The files process_chapter and process_text_item append, in document order. A `file` wins over
+// `files`, and text items nested in a part are not appended.
+fn appended_files(config: &Config) -> Vec<&str> {
+    let mut paths = Vec::new();
+
+    for item in &config.structure {
+        match item {
+            StructureItem::Part { content, .. } => {
+                for chapter in content {
+                    if let StructureItem::Chapter { file, files, .. } = chapter {
+                        push_appended_files(&mut paths, file, files);
+                    }
+                }
+            }
+            StructureItem::Chapter { file, files, .. } | StructureItem::Text { file, files, .. } => {
+                push_appended_files(&mut paths, file, files);
+            }
+        }
+    }
+    paths
+}
+
+fn push_appended_files<'a>(paths: &mut Vec<&'a str>, file: &'a Option<String>, files: &'a Option<Vec<String>>) {
+    match (file, files) {
+        (Some(f), _) => paths.push(f.as_str()),
+        (None, Some(fs)) => paths.extend(fs.iter().map(String::as_str)),
+        (None, None) => {}
+    }
+}
+
+fn load_sources<'a>(config: &'a Config, config_dir: &Path) -> Sources<'a> {
+    // Every file in the structure counts towards the word count, but only appended references
+    // need paragraphs.
+    let mut uses: HashMap<&str, usize> = HashMap::new();
+    for file in appended_files(config) {
+        *uses.entry(file).or_insert(0) += 1;
+    }
+    let mut seen = HashSet::new();
+    let paths: Vec<(&str, usize)> = structure_files(config)
+        .into_iter()
+        .filter(|file| seen.insert(*file))
+        .map(|file| (file, uses.get(file).copied().unwrap_or(0)))
+        .collect();
+
+    // Files are independent, so read them concurrently. This hides per-file latency on slow or
+    // network-mounted drives.
+    let per_worker = paths.len().div_ceil(MAX_WORKERS).max(1);
+    let contents: Vec<std::io::Result<String>> = thread::scope(|scope| {
+        let workers: Vec<_> = paths
+            .chunks(per_worker)
+            .map(|chunk| {
+                scope.spawn(move || {
+                    chunk
+                        .iter()
+                        .map(|&(f, _)| fs::read_to_string(config_dir.join(f)))
+                        .collect::<Vec<_>>()
+                })
+            })
+            .collect();
+        workers.into_iter().flat_map(|w| w.join().unwrap()).collect()
+    });
+
+    // Paragraphs are built here, on one thread and in structure order: docx-rs hands out each
+    // paragraph's w14:paraId from a global counter when it is constructed.
+    let mut sources = Sources::new();
+    for ((file, uses), result) in paths.into_iter().zip(contents) {
+        match result {
+            Ok(content) => {
+                sources.insert(file, source_file(content, uses));
+            }
+            // Only appended files are skipped; the word count passes over the rest silently.
+            Err(_) if uses > 0 => {
+                eprintln!("--> WARNING: Could not find file: {:?}. It will be skipped.", config_dir.join(file))
+            }
+            Err(_) => {}
+        }
+    }
+    sources
+}
+
+fn source_file(content: String, uses: usize) -> SourceFile {
+    if uses == 0 {
+        // Only counted, never appended.
+        return SourceFile { paragraphs: Vec::new(), content: None, words: count_words(&content), uses };
+    }
+    let (paragraphs, words) = parse_source(&content);
+    SourceFile { paragraphs, content: (uses > 1).then_some(content), words, uses }
+}
+
+fn calculate_word_count(config: &Config, sources: &Sources) -> usize {
+    let mut total_words = 0;
+
+    for file in structure_files(config) {
+        if let Some(source) = sources.get(file) {
+            total_words += source.words;
+        }
+    }
+
+    ((total_words as f64) / 100.0).round() as usize * 100
+}
+
+fn format_number(n: usize) -> String {
+    let digits = n.to_string();
+    let mut s = String::with_capacity(digits.len() + digits.len() / 3);
+    for (i, digit) in digits.chars().enumerate() {
+        if i > 0 && (digits.len() - i) % 3 == 0 {
             s.push(',');
-            count = 0;
         }
-        s.push(std::char::from_digit((n % 10) as u32, 10).unwrap());
-        n /= 10;
-        count += 1;
+        s.push(digit);
     }
-    s.chars().rev().collect()
+    s
 }
 
 fn setup_header(doc: Docx, config: &Config, blind: bool) -> Docx {
@@ -179,18 +271,18 @@ fn setup_header(doc: Docx, config: &Config, blind: bool) -> Docx {
 }
 
 fn create_title_page(mut doc: Docx, config: &Config, story_type: &str, word_count: usize, blind: bool) -> Docx {
-    let contact_block = vec![
-        config.author.legal_name.clone(),
-        config.author.street_address.clone(),
-        config.author.city_state_zip.clone(),
-        config.author.phone.clone(),
-        config.author.email.clone(),
+    let contact_block = [
+        config.author.legal_name.as_str(),
+        config.author.street_address.as_str(),
+        config.author.city_state_zip.as_str(),
+        config.author.phone.as_str(),
+        config.author.email.as_str(),
     ];
     
     let left_para = {
         let mut p = Paragraph::new();
         if !blind {
-            for (i, line) in contact_block.iter().enumerate() {
+            for (i, &line) in contact_block.iter().enumerate() {
                 p = p.add_run(Run::new().add_text(line));
                 if i < contact_block.len() - 1 {
                     p = p.add_run(Run::new().add_break(BreakType::TextWrapping));
@@ -234,7 +326,7 @@ fn create_title_page(mut doc: Docx, config: &Config, story_type: &str, word_coun
     }
 
     if story_type == "novel" {
-        doc = doc.add_paragraph(Paragraph::new().add_run(Run::new().add_break(BreakType::Page)));
+        doc = doc.add_paragraph(page_break());
     } else {
         doc = doc.add_paragraph(Paragraph::new());
         doc = doc.add_paragraph(Paragraph::new());
@@ -244,7 +336,7 @@ fn create_title_page(mut doc: Docx, config: &Config, story_type: &str, word_coun
     doc
 }
 
-fn process_chapter(chapter: &StructureItem, mut doc: Docx, _story_type: &str, config_dir: &Path) -> Result<Docx, Box<dyn std::error::Error>> {
+fn process_chapter(chapter: &StructureItem, mut doc: Docx, _story_type: &str, sources: &mut Sources) -> Result<Docx, Box<dyn std::error::Error>> {
     if let StructureItem::Chapter { title, number, file, files } = chapter {
         let mut heading = Vec::new();
         if let Some(num) = number {
@@ -265,17 +357,12 @@ fn process_chapter(chapter: &StructureItem, mut doc: Docx, _story_type: &str, co
         }
 
         if let Some(f) = file {
-            doc = append_file_content(doc, f, config_dir)?;
+            doc = append_file_content(doc, f, sources)?;
         } else if let Some(fs) = files {
             for (i, f) in fs.iter().enumerate() {
-                doc = append_file_content(doc, f, config_dir)?;
+                doc = append_file_content(doc, f, sources)?;
                 if i < fs.len() - 1 {
-                    doc = doc.add_paragraph(
-                        Paragraph::new()
-                            .align(AlignmentType::Center)
-                            .line_spacing(LineSpacing::new().line(480))
-                            .add_run(Run::new().add_text("#"))
-                    );
+                    doc = doc.add_paragraph(scene_break());
                 }
             }
         }
@@ -283,20 +370,15 @@ fn process_chapter(chapter: &StructureItem, mut doc: Docx, _story_type: &str, co
     Ok(doc)
 }
 
-fn process_text_item(text_item: &StructureItem, mut doc: Docx, config_dir: &Path) -> Result<Docx, Box<dyn std::error::Error>> {
+fn process_text_item(text_item: &StructureItem, mut doc: Docx, sources: &mut Sources) -> Result<Docx, Box<dyn std::error::Error>> {
     if let StructureItem::Text { file, files } = text_item {
         if let Some(f) = file {
-            doc = append_file_content(doc, f, config_dir)?;
+            doc = append_file_content(doc, f, sources)?;
         } else if let Some(fs) = files {
             for (i, f) in fs.iter().enumerate() {
-                doc = append_file_content(doc, f, config_dir)?;
+                doc = append_file_content(doc, f, sources)?;
                 if i < fs.len() - 1 {
-                    doc = doc.add_paragraph(
-                        Paragraph::new()
-                            .align(AlignmentType::Center)
-                            .line_spacing(LineSpacing::new().line(480))
-                            .add_run(Run::new().add_text("#"))
-                    );
+                    doc = doc.add_paragraph(scene_break());
                 }
             }
         }
@@ -304,92 +386,373 @@ fn process_text_item(text_item: &StructureItem, mut doc: Docx, config_dir: &Path
     Ok(doc)
 }
 
-fn append_file_content(mut doc: Docx, filepath: &str, config_dir: &Path) -> Result<Docx, Box<dyn std::error::Error>> {
-    let actual_path = config_dir.join(filepath);
-    let content = match fs::read_to_string(&actual_path) {
-        Ok(c) => c,
-        Err(_) => {
-            eprintln!("--> WARNING: Could not find file: {:?}. It will be skipped.", actual_path);
-            return Ok(doc);
-        }
+fn append_file_content(mut doc: Docx, filepath: &str, sources: &mut Sources) -> Result<Docx, Box<dyn std::error::Error>> {
+    // Missing files were already reported when the sources were loaded.
+    let Some(source) = sources.get_mut(filepath) else {
+        return Ok(doc);
     };
 
-    let heading_re = Regex::new(r"^#{1,6}\s")?;
-    
-    for line in content.lines() {
-        let mut trimmed = line.trim();
-        if trimmed.is_empty() || heading_re.is_match(trimmed) {
-            continue;
-        }
+    source.uses = source.uses.saturating_sub(1);
+    let paragraphs = if source.uses == 0 {
+        sources.remove(filepath).unwrap().paragraphs
+    } else {
+        // A repeated file: parse it again so these paragraphs get IDs of their own.
+        parse_source(source.content.as_deref().unwrap_or_default()).0
+    };
+    for p in paragraphs {
+        doc = doc.add_paragraph(p);
+    }
 
-        let mut is_blockquote = false;
-        if trimmed.starts_with('>') {
-            is_blockquote = true;
-            trimmed = trimmed[1..].trim_start();
-        }
+    Ok(doc)
+}
 
-        let tokens_re = Regex::new(r"(\*{1,3}|_{1})")?;
-        let mut p = Paragraph::new()
-            .line_spacing(LineSpacing::new().line(480)); // Double spaced (240 * 2)
+// Turns the contents of a markdown file into body paragraphs and counts their words.
+fn parse_source(content: &str) -> (Vec<Paragraph>, usize) {
+    let mut paragraphs = Vec::new();
+    let mut words = 0;
 
-        if is_blockquote {
-            p = p.indent(Some(720), None, Some(720), None); // 0.5 inch left and right
+    for mut trimmed in content_lines(content) {
+        words += trimmed.split_whitespace().count();
+
+        let mut p = if let Some(quoted) = trimmed.strip_prefix('>') {
+            trimmed = quoted.trim_start();
+            blockquote_paragraph()
         } else {
-            p = p.indent(None, Some(SpecialIndentType::FirstLine(720)), None, None); // 0.5 inch (720 twips)
-        }
+            body_paragraph()
+        };
 
-        let mut is_bold = false;
-        let mut is_italic = false;
+        // Only paragraphs with emphasis or smart punctuation need the scanner.
+        p = if needs_formatting(trimmed) {
+            add_formatted_runs(p, trimmed)
+        } else {
+            p.add_run(Run::new().add_text(trimmed))
+        };
 
-        let mut last_idx = 0;
-        for caps in tokens_re.captures_iter(trimmed) {
-            let m = caps.get(0).unwrap();
-            let text_before = &trimmed[last_idx..m.start()];
-            if !text_before.is_empty() {
-                p = p.add_run(apply_formatting(text_before, is_bold, is_italic));
-            }
-            
-            let token = m.as_str();
-            match token {
-                "***" => { is_bold = !is_bold; is_italic = !is_italic; }
-                "**" => { is_bold = !is_bold; }
-                "*" | "_" => { is_italic = !is_italic; }
-                _ => {}
-            }
-            last_idx = m.end();
-        }
-        let text_after = &trimmed[last_idx..];
-        if !text_after.is_empty() {
-            p = p.add_run(apply_formatting(text_after, is_bold, is_italic));
-        }
+        paragraphs.push(p);
+    }
 
-        doc = doc.add_paragraph(p);
+    (paragraphs, words)
+}
+
+fn count_words(content: &str) -> usize {
+    content_lines(content).map(|line| line.split_whitespace().count()).sum()
+}
+
+// Yields the trimmed paragraphs of a markdown file, skipping blank lines and headings.
+fn content_lines(content: &str) -> impl Iterator<Item = &str> {
+    content
+        .lines()
+        .map(str::trim)
+        .filter(|line| !line.is_empty() && !is_heading(line))
+}
+
+// Markdown headings (# to ######) are used as hidden notes in the source files and are skipped.
+fn is_heading(line: &str) -> bool {
+    let level = line.bytes().take_while(|&b| b == b'#').count();
+    (1..=6).contains(&level) && line[level..].starts_with(char::is_whitespace)
+}
+
+fn double_spaced() -> LineSpacing {
+    LineSpacing::new().line(480) // 240 * 2
+}
+
+fn add_section_break(doc: Docx, story_type: &str) -> Docx {
+    match story_type {
+        "novel" => doc.add_paragraph(page_break()),
+        // Short stories run on, separated by a blank line instead of a new page.
+        "short_story" => doc.add_paragraph(Paragraph::new()),
+        _ => doc,
     }
+}
 
-    Ok(doc)
+fn body_paragraph() -> Paragraph {
+    Paragraph::new()
+        .line_spacing(double_spaced())
+        .indent(None, Some(SpecialIndentType::FirstLine(HALF_INCH)), None, None)
 }
 
-fn apply_formatting(text: &str, bold: bool, italic: bool) -> Run {
-    let mut options = Options::empty();
-    options.insert(Options::ENABLE_SMART_PUNCTUATION);
-    let parser = Parser::new_ext(text, options);
-    
-    let mut smart_text = String::new();
-    for event in parser {
-        if let Event::Text(t) = event {
-            smart_text.push_str(&t);
-        }
+fn blockquote_paragraph() -> Paragraph {
+    Paragraph::new()
+        .line_spacing(double_spaced())
+        .indent(Some(HALF_INCH), None, Some(HALF_INCH), None) // left and right
+}
+
+fn page_break() -> Paragraph {
+    Paragraph::new().add_run(Run::new().add_break(BreakType::Page))
+}
+
+fn scene_break() -> Paragraph {
+    Paragraph::new()
+        .align(AlignmentType::Center)
+        .line_spacing(double_spaced())
+        .add_run(Run::new().add_text(SCENE_BREAK))
+}
+
+fn add_formatted_runs(mut p: Paragraph, text: &str) -> Paragraph {
+    for (span, bold, italic) in formatted_spans(text) {
+        p = p.add_run(apply_formatting(span, bold, italic));
     }
-    
-    let mut run = Run::new().add_text(smart_text);
+    p
+}
+
+fn apply_formatting(text: String, bold: bool, italic: bool) -> Run {
+    let mut run = Run::new().add_text(text);
     if bold { run = run.bold(); }
     if italic { run = run.italic(); }
     run
 }
 
+// Splits a paragraph on the emphasis tokens ***, **, * and _ and applies smart punctuation
+// (curly quotes, en/em dashes and ellipses, following CommonMark's rules) in the same walk,
+// along with backslash escapes and HTML entities.
+// Each stretch of text is returned with the bold/italic state in effect; tokens toggle the
+// state and are dropped. Quotes may pair across tokens, as in '*word*', so the spans are
+// collected before any run is built.
+fn formatted_spans(text: &str) -> Vec<(String, bool, bool)> {
+    let mut spans: Vec<(String, bool, bool)> = Vec::new();
+    let mut out = String::new();
+    let (mut bold, mut italic) = (false, false);
+    // Span index and byte offset of an apostrophe that may still turn out to be an opening quote.
+    let mut single_open: Option<(usize, usize)> = None;
+    let mut double_open = false;
+    let mut prev: Option<char> = None;
+    let mut chars = text.char_indices().peekable();
+
+    while let Some((i, c)) = chars.next() {
+        match c {
+            '*' | '_' => {
+                let len = if c == '_' {
+                    1
+                } else {
+                    text.as_bytes()[i..].iter().take(3).take_while(|&&b| b == b'*').count()
+                };
+                for _ in 1..len {
+                    chars.next();
+                }
+                if !out.is_empty() {
+                    spans.push((std::mem::take(&mut out), bold, italic));
+                }
+                match len {
+                    3 => { bold = !bold; italic = !italic; }
+                    2 => { bold = !bold; }
+                    _ => { italic = !italic; }
+                }
+            }
+            '\'' | '"' => {
+                let next = text[i + 1..].chars().next();
+                let can_open = next.is_some_and(|n| !n.is_whitespace())
+                    && prev.is_none_or(|p| {
+                        p.is_whitespace() || is_punctuation(p) && (c == '"' || !matches!(p, ']' | ')'))
+                    });
+                let can_close = prev.is_some_and(|p| !p.is_whitespace())
+                    && next.is_none_or(|n| n.is_whitespace() || is_punctuation(n));
+
+                if c == '\'' {
+                    match single_open {
+                        Some((span, open)) if can_close => {
+                            let opener = spans.get_mut(span).map_or(&mut out, |(s, _, _)| s);
+                            opener.replace_range(open..open + '\u{2019}'.len_utf8(), "\u{2018}");
+                            single_open = None;
+                        }
+                        _ if can_open => single_open = Some((spans.len(), out.len())),
+                        _ => {}
+                    }
+                    out.push('\u{2019}');
+                } else if can_close && double_open {
+                    double_open = false;
+                    out.push('\u{201D}');
+                } else {
+                    double_open |= can_open;
+                    out.push('\u{201C}');
+                }
+            }
+            '-' => {
+                let mut count = 1;
+                while chars.next_if(|&(_, n)| n == '-').is_some() {
+                    count += 1;
+                }
+                let (ems, ens) = match count {
+                    1 => (0, 0),
+                    2 => (0, 1),
+                    3 => (1, 0),
+                    _ => match count % 6 {
+                        0 | 3 => (count / 3, 0),
+                        2 | 4 => (0, count / 2),
+                        1 => (count / 3 - 1, 2),
+                        _ => (count / 3, 1),
+                    },
+                };
+                if count == 1 {
+                    out.push('-');
+                }
+                out.extend(std::iter::repeat_n('\u{2014}', ems));
+                out.extend(std::iter::repeat_n('\u{2013}', ens));
+                prev = Some('-');
+                continue;
+            }
+            '.' if text[i..].starts_with("...") => {
+                chars.next();
+                chars.next();
+                out.push('\u{2026}');
+            }
+            // A backslash makes the punctuation after it literal: no emphasis, no smart quotes.
+            '\\' if text[i + 1..].starts_with(|n: char| n.is_ascii_punctuation()) => {
+                let (_, escaped) = chars.next().unwrap();
+                out.push(escaped);
+                prev = Some(escaped);
+                continue;
+            }
+            '&' => match entity_at(&text[i..]) {
+                Some((decoded, len)) => {
+                    // References are all ASCII, so bytes and chars line up.
+                    for _ in 1..len {
+                        chars.next();
+                    }
+                    out.push(decoded);
+                    prev = Some(';');
+                    continue;
+                }
+                None => out.push('&'),
+            },
+            _ => out.push(c),
+        }
+        prev = Some(c);
+    }
+    if !out.is_empty() {
+        spans.push((out, bold, italic));
+    }
+    spans
+}
+
+// Decodes the HTML entity or numeric character reference at the start of `text`, returning
+// the character and the length of the reference. Invalid code points become U+FFFD.
+fn entity_at(text: &str) -> Option<(char, usize)> {
+    let end = text.bytes().take(32).position(|b| b == b';')?;
+    let name = &text[1..end];
+    let decoded = if let Some(number) = name.strip_prefix('#') {
+        let (digits, radix, max_len) = match number.strip_prefix(['x', 'X']) {
+            Some(hex) => (hex, 16, 6),
+            None => (number, 10, 7),
+        };
+        if digits.is_empty() || digits.len() > max_len || !digits.chars().all(|d| d.is_digit(radix)) {
+            return None;
+        }
+        let code = u32::from_str_radix(digits, radix).ok()?;
+        char::from_u32(code).filter(|&c| c != '\0').unwrap_or('\u{FFFD}')
+    } else {
+        entities::lookup(name)?
+    };
+    Some((decoded, end + 1))
+}
+
+// Most prose lines have no emphasis, quotes, dashes, ellipses, entities or escapes; let them
+// skip the scanner.
+fn needs_formatting(text: &str) -> bool {
+    let bytes = text.as_bytes();
+    bytes.iter().enumerate().any(|(i, &b)| match b {
+        b'*' | b'_' | b'\'' | b'"' | b'&' | b'\\' => true,
+        b'-' | b'.' => bytes.get(i + 1) == Some(&b),
+        _ => false,
+    })
+}
+
 #[cfg(test)]
 mod tests {
     use super::*;
+    use std::path::PathBuf;
+
+    // A fresh scratch directory under the system temp dir, removed again when dropped,
+    // including when an assertion fails part-way through a test.
+    struct TestDir(PathBuf);
+
+    impl TestDir {
+        fn new(name: &str) -> Self {
+            let path = std::env::temp_dir().join(name);
+            let _ = std::fs::remove_dir_all(&path);
+            std::fs::create_dir_all(&path).unwrap();
+            TestDir(path)
+        }
+    }
+
+    impl std::ops::Deref for TestDir {
+        type Target = Path;
+
+        fn deref(&self) -> &Path {
+            &self.0
+        }
+    }
+
+    impl Drop for TestDir {
+        fn drop(&mut self) {
+            let _ = std::fs::remove_dir_all(&self.0);
+        }
+    }
+
+    const XML_ENTITIES: [(&str, char); 5] = [
+        ("&lt;", '<'),
+        ("&gt;", '>'),
+        ("&quot;", '"'),
+        ("&apos;", '\''),
+        ("&amp;", '&'),
+    ];
+
+    // Joins the contents of every <w:t> element in the document body, so text that was
+    // split across several runs can still be matched as one string.
+    fn docx_text(doc: Docx) -> String {
+        let xml = String::from_utf8(doc.build().document).unwrap();
+        let mut joined = String::new();
+        for element in xml.split("<w:t").skip(1) {
+            // Skip <w:tbl>, <w:tc>, <w:tr> and friends.
+            if !element.starts_with(['>', ' ']) {
+                continue;
+            }
+            let Some(open_end) = element.find('>') else { continue };
+            let body = &element[open_end + 1..];
+            let Some(close) = body.find("</w:t>") else { continue };
+            push_unescaped(&mut joined, &body[..close]);
+        }
+        joined
+    }
+
+    // Decodes the five predefined XML entities while copying, in a single pass over the text.
+    fn push_unescaped(out: &mut String, mut text: &str) {
+        while let Some(amp) = text.find('&') {
+            out.push_str(&text[..amp]);
+            text = &text[amp..];
+            let (ch, len) = XML_ENTITIES
+                .iter()
+                .find(|(entity, _)| text.starts_with(entity))
+                .map_or(('&', 1), |&(entity, ch)| (ch, entity.len()));
+            out.push(ch);
+            text = &text[len..];
+        }
+        out.push_str(text);
+    }
+
+    // The w14:paraId of every paragraph in the document body. docx-rs writes one on each <w:p>,
+    // as in the documents under build/.
+    fn para_ids(doc: Docx) -> Vec<String> {
+        let xml = String::from_utf8(doc.build().document).unwrap();
+        let ids: Vec<String> = xml
+            .split("w14:paraId=\"")
+            .skip(1)
+            .filter_map(|rest| rest.split('"').next())
+            .map(String::from)
+            .collect();
+        let paragraphs = xml.matches("<w:p>").count() + xml.matches("<w:p ").count();
+        assert_eq!(ids.len(), paragraphs, "every <w:p> should carry a w14:paraId");
+        ids
+    }
+
+    fn docx_contains_text(doc: Docx, text: &str) -> bool {
+        docx_text(doc).contains(text)
+    }
+
+    // Builds the document once and checks every needle against the same joined text.
+    fn docx_contains_all(doc: Docx, needles: &[&str]) -> bool {
+        let joined = docx_text(doc);
+        needles.iter().all(|needle| joined.contains(needle))
+    }
 
     #[test]
     fn test_format_number() {
@@ -397,22 +760,96 @@ mod tests {
         assert_eq!(format_number(1234567), "1,234,567");
         assert_eq!(format_number(0), "0");
         assert_eq!(format_number(500), "500");
+        assert_eq!(format_number(1000), "1,000");
+    }
+
+    #[test]
+    fn test_is_heading() {
+        assert!(is_heading("# Title"));
+        assert!(is_heading("###### Deepest"));
+        assert!(is_heading("##\tTabbed"));
+        assert!(!is_heading("####### Too deep"));
+        assert!(!is_heading("#hashtag"));
+        assert!(!is_heading("#"));
+        assert!(!is_heading("Not # a heading"));
+    }
+
+    #[test]
+    fn test_content_lines() {
+        let content = "# Chapter notes\n\n  First paragraph.  \n###### Hidden\n#hashtag line\n\nSecond paragraph.\n";
+        let lines: Vec<&str> = content_lines(content).collect();
+        assert_eq!(lines, vec!["First paragraph.", "#hashtag line", "Second paragraph."]);
+    }
+
+    fn smart_text(text: &str) -> String {
+        formatted_spans(text).into_iter().map(|(span, _, _)| span).collect()
+    }
+
+    #[test]
+    fn test_formatted_spans() {
+        let spans = formatted_spans("Plain *italic* _also_ **bold** ***both*** end");
+        let expected = [
+            ("Plain ", false, false),
+            ("italic", false, true),
+            (" ", false, false),
+            ("also", false, true),
+            (" ", false, false),
+            ("bold", true, false),
+            (" ", false, false),
+            ("both", true, true),
+            (" end", false, false),
+        ];
+        assert_eq!(spans, expected.map(|(s, b, i)| (s.to_string(), b, i)));
+
+        // Runs of more than three asterisks split greedily, like the old \*{1,3} pattern.
+        let spans = formatted_spans("a****b");
+        assert_eq!(spans, vec![("a".to_string(), false, false), ("b".to_string(), true, false)]);
+        assert!(formatted_spans("").is_empty());
+
+        // A quote opened before an emphasis token is closed inside a later span.
+        let spans = formatted_spans("'*word*'");
+        assert_eq!(spans, vec![
+            ("\u{2018}".to_string(), false, false),
+            ("word".to_string(), false, true),
+            ("\u{2019}".to_string(), false, false),
+        ]);
     }
 
     #[test]
     fn test_smart_punctuation() {
-        // Checking that apply_formatting respects pulldown-cmark smart punctuation
-        let run = apply_formatting("\"Hello world\" --- and a dash", false, false);
-        // docx-rs stores the text internally, so it's a bit harder to assert directly against the Run object.
-        // We can just verify it compiles and runs without panicking.
-        let _ = run;
+        assert_eq!(smart_text("\"Hello world\" --- and a dash"), "\u{201C}Hello world\u{201D} \u{2014} and a dash");
+        assert_eq!(smart_text("pages 10--12, wait..."), "pages 10\u{2013}12, wait\u{2026}");
+        assert_eq!(smart_text("'Tis Sam's 'quote' here"), "\u{2019}Tis Sam\u{2019}s \u{2018}quote\u{2019} here");
+        assert_eq!(smart_text("*\"Hi,\"* she said"), "\u{201C}Hi,\u{201D} she said");
+        assert_eq!(smart_text("\u{00A9}'a' and \u{20AC}'5'"), "\u{00A9}\u{2018}a\u{2019} and \u{20AC}\u{2018}5\u{2019}");
+        assert_eq!(smart_text("a well-known fact"), "a well-known fact");
+        assert!(!needs_formatting("Plain prose. No marks, one-dash."));
+    }
+
+    #[test]
+    fn test_entities_and_escapes() {
+        assert_eq!(smart_text("a &mdash; b"), "a \u{2014} b");
+        assert_eq!(smart_text("Tom &amp; Jerry"), "Tom & Jerry");
+        assert_eq!(smart_text("non&nbsp;breaking"), "non\u{00A0}breaking");
+        assert_eq!(smart_text("&#8212; and &#x2014;"), "\u{2014} and \u{2014}");
+        assert_eq!(smart_text("&#0; &#x110000;"), "\u{FFFD} \u{FFFD}");
+        assert_eq!(smart_text("AT&T &bogus; &amp"), "AT&T &bogus; &amp");
+        assert_eq!(smart_text("&quot;plain&quot;"), "\"plain\"");
+
+        assert_eq!(smart_text("say \\\"hi\\\""), "say \"hi\"");
+        assert_eq!(smart_text("a \\-- b \\... c"), "a -- b ... c");
+        assert_eq!(smart_text("C:\\path and a\\"), "C:\\path and a\\");
+        // With escapes and emphasis in one scanner, escaped or referenced tokens are plain text.
+        assert_eq!(formatted_spans("\\*not italic\\* \\\\"), vec![("*not italic* \\".to_string(), false, false)]);
+        assert_eq!(formatted_spans("&#42;x&#95;"), vec![("*x_".to_string(), false, false)]);
+
+        assert!(needs_formatting("Tom &amp; Jerry"));
+        assert!(needs_formatting("a \\* b"));
     }
 
     #[test]
     fn test_calculate_word_count() {
-        let temp_dir = std::env::temp_dir().join("mdmf_test_word_count");
-        let _ = std::fs::remove_dir_all(&temp_dir);
-        std::fs::create_dir_all(&temp_dir).unwrap();
+        let temp_dir = TestDir::new("mdmf_test_word_count");
         
         let file_path = temp_dir.join("test_chapter.md");
         let mut content = "Word ".repeat(60);
@@ -438,10 +875,77 @@ mod tests {
             ],
         };
         
-        let count = calculate_word_count(&config, &temp_dir).unwrap();
+        let sources = load_sources(&config, &temp_dir);
+        let count = calculate_word_count(&config, &sources);
         assert_eq!(count, 100); // 60 words rounds to nearest 100, which is 100
-        
-        std::fs::remove_dir_all(&temp_dir).unwrap();
+    }
+
+    #[test]
+    fn test_load_sources() {
+        let temp_dir = TestDir::new("mdmf_test_load_sources");
+
+        // More files than reader threads, with a duplicate and a missing file.
+        let mut scenes: Vec<String> = (0..20).map(|i| format!("scene{}.md", i)).collect();
+        for scene in &scenes {
+            std::fs::write(temp_dir.join(scene), format!("Contents of {}", scene)).unwrap();
+        }
+        scenes.push("scene3.md".into());
+        scenes.push("missing.md".into());
+
+        let mut config = create_dummy_config();
+        config.structure = vec![
+            crate::config::StructureItem::Chapter { title: None, number: None, file: None, files: Some(scenes) },
+            // Text nested in a part is counted but never appended.
+            crate::config::StructureItem::Part {
+                title: "Part".into(),
+                content: vec![
+                    crate::config::StructureItem::Text { file: Some("scene5.md".into()), files: None },
+                    crate::config::StructureItem::Text { file: Some("extra.md".into()), files: None },
+                ],
+            },
+        ];
+        std::fs::write(temp_dir.join("extra.md"), "Counted but not appended.").unwrap();
+
+        let sources = load_sources(&config, &temp_dir);
+        assert_eq!(sources.len(), 21);
+        assert_eq!(sources["scene7.md"].paragraphs.len(), 1);
+        assert_eq!(sources["scene7.md"].words, 3);
+        assert_eq!(sources["scene3.md"].uses, 2);
+        assert!(sources["scene3.md"].content.is_some());
+        assert_eq!(sources["scene5.md"].uses, 1);
+        assert!(sources["scene5.md"].content.is_none());
+        assert_eq!(sources["extra.md"].uses, 0);
+        assert_eq!(sources["extra.md"].words, 4);
+        assert!(sources["extra.md"].paragraphs.is_empty());
+        assert!(!sources.contains_key("missing.md"));
+    }
+
+    #[test]
+    fn test_load_sources_paragraph_ids() {
+        let temp_dir = TestDir::new("mdmf_test_paragraph_ids");
+
+        // Enough files, and long enough ones, for the worker threads to overlap.
+        let scenes: Vec<String> = (0..24).map(|i| format!("scene{}.md", i)).collect();
+        for scene in &scenes {
+            let lines: Vec<String> = (0..200).map(|line| format!("Line {} of {}.", line, scene)).collect();
+            std::fs::write(temp_dir.join(scene), lines.join("\n")).unwrap();
+        }
+
+        let mut config = create_dummy_config();
+        config.structure = vec![
+            crate::config::StructureItem::Chapter { title: None, number: None, file: None, files: Some(scenes.clone()) }
+        ];
+
+        let mut sources = load_sources(&config, &temp_dir);
+        let mut doc = Docx::new();
+        for scene in &scenes {
+            doc = append_file_content(doc, scene, &mut sources).expect("Failed to append");
+        }
+
+        // Built on one thread in structure order, so the IDs are unique and ascending.
+        let ids = para_ids(doc);
+        assert_eq!(ids.len(), 4800);
+        assert!(ids.windows(2).all(|pair| pair[0] < pair[1]));
     }
 
     fn create_dummy_config() -> Config {
@@ -477,17 +981,18 @@ mod tests {
         let config = create_dummy_config();
         
         let doc_normal = create_title_page(Docx::new(), &config, "novel", 50000, false);
-        let _ = doc_normal;
+        assert!(docx_contains_all(doc_normal, &["Test Legal Name", "Approx. 50,000 words", "TEST TITLE", "Test Byline"]));
 
         let doc_blind = create_title_page(Docx::new(), &config, "novel", 50000, true);
-        let _ = doc_blind;
+        let blind_text = docx_text(doc_blind);
+        assert!(blind_text.contains("TEST TITLE"));
+        assert!(!blind_text.contains("Test Legal Name"));
+        assert!(!blind_text.contains("Test Byline"));
     }
 
     #[test]
     fn test_process_chapter_and_text() {
-        let temp_dir = std::env::temp_dir().join("mdmf_test_chapter");
-        let _ = std::fs::remove_dir_all(&temp_dir);
-        std::fs::create_dir_all(&temp_dir).unwrap();
+        let temp_dir = TestDir::new("mdmf_test_chapter");
         
         let file_path1 = temp_dir.join("ch1.md");
         std::fs::write(&file_path1, "This is chapter one.\nIt has **bold** and *italic* text.").unwrap();
@@ -503,40 +1008,58 @@ mod tests {
             file: Some("text1.md".into()), files: None
         };
 
+        let mut config = create_dummy_config();
+        config.structure = vec![chapter, text_item];
+        let mut sources = load_sources(&config, &temp_dir);
+
         let doc = Docx::new();
-        let doc = process_chapter(&chapter, doc, "novel", &temp_dir).expect("Failed to process chapter");
-        let doc = process_text_item(&text_item, doc, &temp_dir).expect("Failed to process text item");
-        
-        let _ = doc; // verify we got here safely
+        let doc = process_chapter(&config.structure[0], doc, "novel", &mut sources).expect("Failed to process chapter");
+        let doc = process_text_item(&config.structure[1], doc, &mut sources).expect("Failed to process text item");
 
-        std::fs::remove_dir_all(&temp_dir).unwrap();
+        // Emphasis splits the line into runs; the text between them must keep its spaces.
+        assert!(docx_contains_text(doc, "Chapter 1: Chapter OneThis is chapter one.It has bold and italic text.This is some unstructured text."));
     }
 
     #[test]
     fn test_append_file_content() {
-        let temp_dir = std::env::temp_dir().join("mdmf_test_append");
-        let _ = std::fs::remove_dir_all(&temp_dir);
-        std::fs::create_dir_all(&temp_dir).unwrap();
+        let temp_dir = TestDir::new("mdmf_test_append");
         
         let file_path = temp_dir.join("append.md");
         std::fs::write(&file_path, "Content to append.\n> Blockquote text.\nWith a second line.").unwrap();
 
-        let doc = Docx::new();
-        let doc = append_file_content(doc, "append.md", &temp_dir).expect("Failed to append");
-        let _ = doc;
+        let mut config = create_dummy_config();
+        config.structure = vec![
+            crate::config::StructureItem::Text { file: Some("append.md".into()), files: None },
+            crate::config::StructureItem::Text { file: Some("missing.md".into()), files: None },
+            crate::config::StructureItem::Text { file: Some("append.md".into()), files: None },
+        ];
+        let mut sources = load_sources(&config, &temp_dir);
+        assert!(!sources.contains_key("missing.md"));
+
+        // A file referenced twice is appended in full both times.
+        let expected = "Content to append.Blockquote text.With a second line.";
+        let doc = append_file_content(Docx::new(), "append.md", &mut sources).expect("Failed to append");
+        assert!(docx_contains_text(doc, expected));
+        let doc = append_file_content(Docx::new(), "append.md", &mut sources).expect("Failed to append");
+        assert!(docx_contains_text(doc, expected));
+        assert!(!sources.contains_key("append.md"));
+
+        // Both references get paragraphs of their own, so no paraId repeats.
+        let mut sources = load_sources(&config, &temp_dir);
+        let doc = append_file_content(Docx::new(), "append.md", &mut sources).expect("Failed to append");
+        let doc = append_file_content(doc, "append.md", &mut sources).expect("Failed to append");
+        let ids = para_ids(doc);
+        assert_eq!(ids.len(), 6);
+        assert_eq!(ids.iter().collect::<HashSet<_>>().len(), ids.len());
 
         // Test missing file
-        let doc_missing = append_file_content(Docx::new(), "missing.md", &temp_dir).expect("Failed on missing file, should return ok and skip");
-        let _ = doc_missing;
-
-        std::fs::remove_dir_all(&temp_dir).unwrap();
+        let doc_missing = append_file_content(Docx::new(), "missing.md", &mut sources).expect("Failed on missing file, should return ok and skip");
+        assert!(!docx_contains_text(doc_missing, "Content"));
     }
 
     #[test]
     fn test_compile_manuscript_integration() {
-        let temp_dir = std::env::temp_dir().join("mdmf_test_integration");
-        let _ = std::fs::remove_dir_all(&temp_dir);
-        std::fs::create_dir_all(&temp_dir).unwrap();
+        let temp_dir = TestDir::new("mdmf_test_integration");
 
         let md_file = temp_dir.join("content.md");
         std::fs::write(&md_file, "Integration test content with ***bold-italic*** formatting.").unwrap();
@@ -579,7 +1102,5 @@ structure:
 
         let out_file_blind = out_dir_blind.join("integrated_output.docx");
         assert!(out_file_blind.exists());
-
-        std::fs::remove_dir_all(&temp_dir).unwrap();
     }
 }
@@ -1,6 +1,8 @@
 pub mod args;
 pub mod config;
 pub mod docx_builder;
+pub mod entities;
+pub mod punctuation;
 
 use clap::Parser;
 use args::Args;